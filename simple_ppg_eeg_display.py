@@ -5,7 +5,7 @@ This is a simplified version ready to run.
 Just upload the Arduino code and run this Python script.
 
 Requirements:
-pip install numpy matplotlib scipy pyserial
+pip install numpy matplotlib scipy pyserial numba
 
 Author: For NUS Student
 Date: October 2025
@@ -15,10 +15,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from scipy import signal
+from numba import njit
 import serial
 import time
+import threading
+import warnings
 from datetime import datetime
-from collections import deque
 
 # ----------------------------------------------------------------------------
 # CONFIGURATION - CHANGE THESE FOR YOUR SETUP
@@ -29,9 +31,19 @@ PPG_SAMPLING_RATE = 100  # Hz
 EEG_SAMPLING_RATE = 250  # Hz
 DISPLAY_WINDOW = 10       # seconds
 UPDATE_INTERVAL = 100     # ms
+BUFFER_SIZE = 3000        # samples kept for filtering and display
+
+# A corrupted line makes np.fromstring stop early; read_data notices the short
+# result and falls back to line-by-line parsing, so the warning is just noise.
+warnings.filterwarnings('ignore', message='string or file could not be read to its end',
+                        category=DeprecationWarning)
+
+# Let Agg merge line segments that fall within a pixel of each other
+plt.rcParams['path.simplify'] = True
+plt.rcParams['path.simplify_threshold'] = 1.0
 
 # ----------------------------------------------------------------------------
-# STEP 1: DESIGN FILTERS
+# STEP 1: DESIGN FILTERS (once, at import)
 # ----------------------------------------------------------------------------
 def design_filters():
     nyq_ppg = 0.5 * PPG_SAMPLING_RATE
@@ -43,7 +55,15 @@ def design_filters():
     notch_freq = 50.0 / nyq_eeg  # 50 Hz (Singapore)
     notch_b, notch_a = signal.iirnotch(notch_freq, 30)
 
-    return ppg_sos, eeg_sos, notch_b, notch_a
+    # Band-pass and notch as one cascade, so EEG needs a single sosfilt call
+    eeg_sos = np.vstack((eeg_sos, signal.tf2sos(notch_b, notch_a)))
+
+    # float32 to match the sample buffer, so sosfilt stays in single precision
+    ppg_sos = np.ascontiguousarray(ppg_sos, dtype=np.float32)
+    eeg_sos = np.ascontiguousarray(eeg_sos, dtype=np.float32)
+    return ppg_sos, eeg_sos
+
+PPG_SOS, EEG_SOS = design_filters()
 
 # ----------------------------------------------------------------------------
 # STEP 2: CONNECT ARDUINO
@@ -62,27 +82,79 @@ def connect_arduino(port, baud):
 # ----------------------------------------------------------------------------
 # STEP 3: FILTER FUNCTIONS
 # ----------------------------------------------------------------------------
-def filter_ppg(data, sos):
-    if len(data) < 20:
-        return data
-    return signal.sosfilt(sos, data)
+def make_sosfilt(sos):
+    # Generate and compile a streaming sosfilt for one fixed cascade. The
+    # coefficients are written into the source as literals and the sections
+    # are unrolled, so the compiled loop keeps them in registers. Same
+    # transposed direct form II recurrence as signal.sosfilt; zi is updated
+    # in place and also returned.
+    src = ["def sosfilt(x, zi):",
+           "    y = np.empty_like(x)",
+           "    for n in range(x.size):",
+           "        s = x[n]"]
+    for k, (b0, b1, b2, _, a1, a2) in enumerate(sos.tolist()):
+        src += [f"        t = {b0!r} * s + zi[{k}, 0]",
+                f"        zi[{k}, 0] = {b1!r} * s - {a1!r} * t + zi[{k}, 1]",
+                f"        zi[{k}, 1] = {b2!r} * s - {a2!r} * t",
+                "        s = t"]
+    src += ["        y[n] = s",
+            "    return y, zi"]
+    namespace = {'np': np}
+    exec("\n".join(src), namespace)
+    return njit(namespace['sosfilt'])
 
-def filter_eeg(data, sos, notch_b, notch_a):
-    if len(data) < 20:
-        return data
-    filtered = signal.sosfilt(sos, data)
-    return signal.filtfilt(notch_b, notch_a, filtered)
+# Both filters are causal and stream: they take the filter state left by
+# the previous batch and return the new one, so each call only touches the
+# samples that just arrived.
+filter_ppg = make_sosfilt(PPG_SOS)
+filter_eeg = make_sosfilt(EEG_SOS)
 
 # ----------------------------------------------------------------------------
 # STEP 4: PEAK DETECTION & HEART RATE
 # ----------------------------------------------------------------------------
+@njit(cache=True)
+def _find_peaks(x, threshold, min_dist):
+    # Same result as signal.find_peaks(x, height=threshold, distance=min_dist):
+    # collect local maxima above threshold, then keep the highest ones and
+    # drop any neighbour closer than min_dist.
+    cand = np.empty(x.size, dtype=np.int64)
+    n = 0
+    i = 1
+    while i < x.size - 1:
+        if x[i] > x[i - 1]:
+            # Step over a flat top and take its middle sample
+            j = i
+            while j < x.size - 1 and x[j + 1] == x[i]:
+                j += 1
+            if j < x.size - 1 and x[j + 1] < x[i] and x[i] >= threshold:
+                cand[n] = (i + j) // 2
+                n += 1
+            i = j
+        i += 1
+    cand = cand[:n]
+
+    keep = np.ones(n, dtype=np.bool_)
+    order = np.argsort(x[cand], kind='mergesort')
+    for k in range(n - 1, -1, -1):
+        j = order[k]
+        if not keep[j]:
+            continue
+        m = j - 1
+        while m >= 0 and cand[j] - cand[m] < min_dist:
+            keep[m] = False
+            m -= 1
+        m = j + 1
+        while m < n and cand[m] - cand[j] < min_dist:
+            keep[m] = False
+            m += 1
+    return cand[keep]
+
 def detect_peaks(ppg_data, rate):
     if len(ppg_data) < 10:
         return np.array([])
     threshold = np.mean(ppg_data) + 0.5*np.std(ppg_data)
     dist = int(rate * 0.5)
-    peaks, _ = signal.find_peaks(ppg_data, height=threshold, distance=dist)
-    return peaks
+    return _find_peaks(ppg_data, threshold, dist)
 
 def calculate_heart_rate(peaks, rate):
     if len(peaks) < 2:
@@ -92,22 +164,57 @@ def calculate_heart_rate(peaks, rate):
     return hr if 40 < hr < 200 else 0
 
 # ----------------------------------------------------------------------------
-# STEP 5: REAL-TIME DISPLAY CLASS
+# STEP 5: PLOT DECIMATION
+# ----------------------------------------------------------------------------
+def decimate_minmax(t, y, width_px):
+    # With more than two points per pixel, keep only the min and max of each
+    # pixel-sized bucket (in time order) so peaks still show. Incomplete
+    # buckets are dropped from the old end, never the newest samples.
+    width_px = int(width_px)
+    if width_px < 1:  # axes squeezed to nothing: nothing to decimate to
+        return t, y
+    bucket = len(y) // width_px
+    if bucket < 2:
+        return t, y
+    n_buckets = len(y) // bucket
+    start = len(y) - n_buckets * bucket
+    yb = y[start:].reshape(n_buckets, bucket)
+    lo, hi = yb.argmin(axis=1), yb.argmax(axis=1)
+    offsets = start + bucket * np.arange(n_buckets)
+    idx = (np.column_stack((np.minimum(lo, hi), np.maximum(lo, hi))) + offsets[:, None]).ravel()
+    return t[idx], y[idx]
+
+# ----------------------------------------------------------------------------
+# STEP 6: REAL-TIME DISPLAY CLASS
 # ----------------------------------------------------------------------------
 class RealTimeDisplay:
     def __init__(self, ser):
         self.ser = ser
-        self.ppg_sos, self.eeg_sos, self.notch_b, self.notch_a = design_filters()
+        self._rxbuf = bytearray()
 
-        self.time_data = deque(maxlen=3000)
-        self.ppg_raw, self.eeg_raw = deque(maxlen=3000), deque(maxlen=3000)
-        self.ppg_filt, self.eeg_filt = deque(maxlen=3000), deque(maxlen=3000)
+        # Ring buffer with columns: time, PPG raw, EEG raw, PPG filtered,
+        # EEG filtered. Each row is written twice (at i and i + BUFFER_SIZE)
+        # so the newest samples are always one contiguous slice.
+        self.buf = np.zeros((2 * BUFFER_SIZE, 5), dtype=np.float32)
+        self.head = 0
+        self.count = 0
+        # Guards buf/head/count between the reader thread and the UI
+        self._write_lock = threading.Lock()
+
+        # Filter states, set from the first sample received
+        self.zi_ppg = self.zi_eeg = None
 
         self.start_time = time.time()
         self.heart_rate = 0
         self.peaks = np.array([])
 
-        self.log = open(f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", 'w')
+        # The serial port is drained on its own thread so a slow frame never
+        # leaves samples piling up in the OS buffer
+        self._stop = threading.Event()
+        self.rx_thread = threading.Thread(target=self._reader, daemon=True)
+
+        self.log = open(f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", 'w',
+                        buffering=1 << 20)
         self.log.write("Time,PPG_Raw,PPG_Filtered,EEG_Raw,EEG_Filtered,HeartRate\n")
 
         self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(12, 8))
@@ -122,57 +229,131 @@ class RealTimeDisplay:
 
         self.ax2.set_title("EEG Signal")
         self.ax2.set_ylabel("µV")
-        self.ax2.set_xlabel("Time (s)")
+        self.ax2.set_xlabel("Time before now (s)")
         self.line_eeg, = self.ax2.plot([], [], lw=1.5)
 
+    def push(self, rows):
+        rows = rows[-BUFFER_SIZE:]
+        idx = (self.head + np.arange(len(rows))) % BUFFER_SIZE
+        self.buf[idx] = rows
+        self.buf[idx + BUFFER_SIZE] = rows
+        self.head = (self.head + len(rows)) % BUFFER_SIZE
+        self.count = min(self.count + len(rows), BUFFER_SIZE)
+
+    def window(self, n=None):
+        n = self.count if n is None else min(n, self.count)
+        end = self.head + BUFFER_SIZE
+        return self.buf[end - n:end]
+
     def read_data(self):
-        try:
-            if self.ser.in_waiting:
-                line = self.ser.readline().decode().strip().split(',')
-                if len(line) == 2:
-                    return float(line[0]), float(line[1])
-        except:
-            return None, None
-        return None, None
+        # Drain everything the driver has buffered in one read and keep any
+        # trailing partial line for the next call. Returns an (n, 2) array
+        # of (ppg, eeg) rows. Blocks for up to the port timeout when nothing
+        # is pending, which is fine on the reader thread.
+        empty = np.empty((0, 2))
+        self._rxbuf += self.ser.read(self.ser.in_waiting or 1)
+
+        end = self._rxbuf.rfind(b'\n')
+        if end < 0:
+            return empty
+        complete = bytes(self._rxbuf[:end])
+        del self._rxbuf[:end + 1]
+
+        # Fast path: if every line has exactly one comma, parse the whole
+        # batch in NumPy's C parser
+        raw = np.frombuffer(complete, dtype=np.uint8)
+        commas = np.cumsum(raw == ord(','))
+        per_line = np.diff(commas[raw == ord('\n')], prepend=0, append=commas[-1:])
+        if raw.size and np.all(per_line == 1):
+            try:
+                values = np.fromstring(complete.replace(b'\n', b','), sep=',')
+            except ValueError:
+                values = empty
+            if values.size == 2 * commas[-1]:
+                return values.reshape(-1, 2)
+
+        # Something in the batch is malformed: keep only the good lines
+        samples = []
+        for line in complete.split(b'\n'):
+            parts = line.strip().split(b',')
+            if len(parts) == 2:
+                try:
+                    samples.append((float(parts[0]), float(parts[1])))
+                except ValueError:
+                    pass
+        return np.array(samples).reshape(-1, 2)
+
+    def process(self, samples):
+        n = len(samples)
+        # Spread the batch back from "now" at the sample period
+        now = time.time() - self.start_time
+        times = now - np.arange(n - 1, -1, -1) / PPG_SAMPLING_RATE
+        rows = np.zeros((n, 5), dtype=np.float32)
+        rows[:, 0] = times
+        rows[:, 1:3] = samples
+
+        if self.zi_ppg is None:
+            self.zi_ppg = (signal.sosfilt_zi(PPG_SOS) * rows[0, 1]).astype(np.float32)
+            self.zi_eeg = (signal.sosfilt_zi(EEG_SOS) * rows[0, 2]).astype(np.float32)
+
+        rows[:, 3], self.zi_ppg = filter_ppg(rows[:, 1], self.zi_ppg)
+        rows[:, 4], self.zi_eeg = filter_eeg(rows[:, 2], self.zi_eeg)
+        with self._write_lock:
+            self.push(rows)
+
+        # One write per batch; the file's own buffer absorbs the rest
+        hr = f"{self.heart_rate:.1f}"
+        self.log.write("".join(
+            f"{t:.3f},{ppg_val},{pf:.6g},{eeg_val},{ef:.6g},{hr}\n"
+            for t, (ppg_val, eeg_val), pf, ef in zip(times, samples, rows[:, 3], rows[:, 4])))
+
+    def _reader(self):
+        while not self._stop.is_set():
+            try:
+                samples = self.read_data()
+            except Exception as e:
+                print(f"✗ Serial read failed, stopping reader: {e}")
+                return
+            if len(samples):
+                self.process(samples)
 
     def update(self, frame):
-        ppg_val, eeg_val = self.read_data()
-        if ppg_val is not None:
-            t = time.time() - self.start_time
-            self.time_data.append(t)
-            self.ppg_raw.append(ppg_val)
-            self.eeg_raw.append(eeg_val)
-
-            if len(self.ppg_raw) > 50:
-                ppg_filtered = filter_ppg(self.ppg_raw, self.ppg_sos)
-                eeg_filtered = filter_eeg(self.eeg_raw, self.eeg_sos, self.notch_b, self.notch_a)
-                self.ppg_filt = deque(ppg_filtered, maxlen=3000)
-                self.eeg_filt = deque(eeg_filtered, maxlen=3000)
-
-                self.peaks = detect_peaks(ppg_filtered, PPG_SAMPLING_RATE)
-                if len(self.peaks) > 1:
-                    self.heart_rate = calculate_heart_rate(self.peaks, PPG_SAMPLING_RATE)
-
-            self.log.write(f"{t:.3f},{ppg_val},{self.ppg_filt[-1] if self.ppg_filt else 0},"
-                           f"{eeg_val},{self.eeg_filt[-1] if self.eeg_filt else 0},"
-                           f"{self.heart_rate:.1f}\n")
-
-        # Update plots
-        if self.time_data:
-            t = np.array(self.time_data)
-            self.line_ppg.set_data(t, list(self.ppg_filt))
-            self.line_eeg.set_data(t, list(self.eeg_filt))
+        # Copy out a stable snapshot; filtering already happened on the reader
+        with self._write_lock:
+            win = self.window().copy()
+
+        if len(win) > 50:
+            self.peaks = detect_peaks(win[:, 3], PPG_SAMPLING_RATE)
+            if len(self.peaks) > 1:
+                self.heart_rate = calculate_heart_rate(self.peaks, PPG_SAMPLING_RATE)
+
+        # Update plots (time is relative to the newest sample so the axes
+        # never move and only the artists need redrawing)
+        if len(win):
+            # Only the visible part of the buffer is handed to the lines
+            win = win[-DISPLAY_WINDOW * PPG_SAMPLING_RATE:]
+            t = win[:, 0] - win[-1, 0]
+            width_px = self.ax1.bbox.width
+            self.line_ppg.set_data(*decimate_minmax(t, win[:, 3], width_px))
+            self.line_eeg.set_data(*decimate_minmax(t, win[:, 4], width_px))
             self.hr_text.set_text(f"Heart Rate: {self.heart_rate:.1f} BPM")
 
-            self.ax1.set_xlim(max(0, t[-1]-DISPLAY_WINDOW), t[-1])
-            self.ax2.set_xlim(max(0, t[-1]-DISPLAY_WINDOW), t[-1])
+        return self.line_ppg, self.peaks_plot, self.line_eeg, self.hr_text
 
-        return self.line_ppg, self.line_eeg
+    def init_plot(self):
+        self.ax1.set_xlim(-DISPLAY_WINDOW, 0)
+        self.ax2.set_xlim(-DISPLAY_WINDOW, 0)
+        return self.line_ppg, self.peaks_plot, self.line_eeg, self.hr_text
 
     def run(self):
         print("Starting real-time plot...")
-        FuncAnimation(self.fig, self.update, interval=UPDATE_INTERVAL)
+        self.rx_thread.start()
+        self.anim = FuncAnimation(self.fig, self.update, init_func=self.init_plot,
+                                  interval=UPDATE_INTERVAL, blit=True,
+                                  cache_frame_data=False)
         plt.show()
+        self._stop.set()
+        self.rx_thread.join(timeout=2)
         self.log.close()
         if self.ser:
             self.ser.close()
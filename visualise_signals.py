@@ -1,7 +1,23 @@
 import os
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from matplotlib.collections import PolyCollection
+
+# Timestamp format of the Time column in the P_ and BIS_ exports
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# ========== LOADING ==========
+
+def read_timed_csv(path, names, dtype):
+    """Read a P_/BIS_ file under the given column names, parsing Time as datetimes."""
+    df = pd.read_csv(path, header=0, names=names, dtype=dtype)
+    try:
+        df['Time'] = pd.to_datetime(df['Time'], format=TIME_FORMAT, errors='raise')
+    except (ValueError, TypeError):
+        # Not in TIME_FORMAT (e.g. numeric seconds): convert the column as read
+        df['Time'] = pd.to_datetime(df['Time'], errors='coerce')
+    return df
 
 # ========== ABNORMAL DETECTION FUNCTIONS ==========
 
@@ -18,29 +34,23 @@ def detect_abnormalities_bis(df, low_threshold=20, high_threshold=80):
 
 def draw_alert_boxes(ax, time_series, abnormal_series, color='red', alpha=0.2):
     """Highlight time segments with abnormal values using translucent boxes."""
-    abnormal_indices = abnormal_series[abnormal_series].index
-    if abnormal_indices.empty:
+    abnormal = np.asarray(abnormal_series, dtype=bool)
+    if len(time_series) == 0 or not abnormal.any():
         return
-    start = abnormal_indices[0]
-    end = start
-    for i in range(1, len(abnormal_indices)):
-        if abnormal_indices[i] != abnormal_indices[i-1] + 1:
-            ax.add_patch(patches.Rectangle(
-                (time_series[start], ax.get_ylim()[0]),
-                time_series[end] - time_series[start],
-                ax.get_ylim()[1] - ax.get_ylim()[0],
-                linewidth=0,
-                facecolor=color,
-                alpha=alpha))
-            start = abnormal_indices[i]
-        end = abnormal_indices[i]
-    ax.add_patch(patches.Rectangle(
-        (time_series[start], ax.get_ylim()[0]),
-        time_series[end] - time_series[start],
-        ax.get_ylim()[1] - ax.get_ylim()[0],
-        linewidth=0,
-        facecolor=color,
-        alpha=alpha))
+
+    # Edges of the padded mask give one (start, stop) index pair per run
+    edges = np.flatnonzero(np.diff(np.r_[0, abnormal.view(np.int8), 0])).reshape(-1, 2)
+    starts, ends = edges[:, 0], edges[:, 1] - 1
+
+    time_array = np.asarray(ax.convert_xunits(time_series), dtype=float)
+    x0, x1 = time_array[starts], time_array[ends]
+    ymin, ymax = ax.get_ylim()
+
+    # One polygon per run, all drawn as a single collection artist
+    verts = np.empty((len(starts), 4, 2))
+    verts[:, :, 0] = np.column_stack((x0, x0, x1, x1))
+    verts[:, :, 1] = (ymin, ymax, ymax, ymin)
+    return ax.add_collection(PolyCollection(verts, linewidth=0, facecolor=color, alpha=alpha))
 
 # ========== SYNCHRONIZED MULTI-CHANNEL VISUALIZATION ==========
 
@@ -52,18 +62,17 @@ def visualize_combined(data_folder, low_eeg=20, high_eeg=80):
     bis_df = None
     abnormal_eeg = None
     if bis_file:
-        bis_df = pd.read_csv(os.path.join(data_folder, bis_file))
-        bis_df.columns = ['Time', 'EEG']
-        bis_df['Time'] = pd.to_datetime(bis_df['Time'], errors='coerce')
+        bis_df = read_timed_csv(os.path.join(data_folder, bis_file),
+                                ['Time', 'EEG'], {'EEG': 'float32'})
         abnormal_eeg = detect_abnormalities_bis(bis_df, low_eeg, high_eeg)
 
     # Process P_number files
     for filename in os.listdir(data_folder):
         if filename.startswith("P_") and filename.endswith(".csv"):
             print(f"Visualizing synchronized data for {filename}...")
-            df = pd.read_csv(os.path.join(data_folder, filename))
-            df.columns = ['Time', 'HeartRate', 'SPO2']  # Corrected column order
-            df['Time'] = pd.to_datetime(df['Time'], errors='coerce')
+            df = read_timed_csv(os.path.join(data_folder, filename),
+                                ['Time', 'HeartRate', 'SPO2'],  # Corrected column order
+                                {'HeartRate': 'float32', 'SPO2': 'float32'})
 
             abnormal_hr, abnormal_spo2 = detect_abnormalities_p(df)
 
@@ -1,97 +1,93 @@
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from matplotlib.collections import PolyCollection
 import time
-from collections import deque
 import numpy as np
+from numba import njit
 
 class RealTimeDataBuffer:
     def __init__(self, window_size=180):
         self.window_size = window_size
-        # Create circular buffers for each signal
-        self.time_buffer = deque(maxlen=window_size)
-        self.hr_buffer = deque(maxlen=window_size)
-        self.spo2_buffer = deque(maxlen=window_size)
-        self.eeg_buffer = deque(maxlen=window_size)
+        # Circular buffer with one row per channel: time, HR, SpO2, EEG (NaN
+        # when no EEG value arrived), so each channel is contiguous in memory.
+        # Each sample is written at idx and at idx + window_size so the latest
+        # samples are always one contiguous slice and get_data can hand out
+        # views instead of copies. Kept as float64 for the timestamps.
+        self.arr = np.full((4, 2 * window_size), np.nan)
+        self.idx = 0
+        self.n = 0
         
     def update(self, time_val, hr_val, spo2_val, eeg_val=None):
-        self.time_buffer.append(time_val)
-        self.hr_buffer.append(hr_val)
-        self.spo2_buffer.append(spo2_val)
-        if eeg_val is not None:
-            self.eeg_buffer.append(eeg_val)
+        col = (time_val, hr_val, spo2_val, np.nan if eeg_val is None else eeg_val)
+        self.arr[:, self.idx] = col
+        self.arr[:, self.idx + self.window_size] = col
+        self.idx = (self.idx + 1) % self.window_size
+        self.n = min(self.n + 1, self.window_size)
             
     def get_data(self):
+        end = self.idx + self.window_size
+        time_data, hr, spo2, eeg = self.arr[:, end - self.n:end]
         return {
-            'Time': list(self.time_buffer),
-            'HeartRate': list(self.hr_buffer),
-            'SPO2': list(self.spo2_buffer),
-            'EEG': list(self.eeg_buffer) if self.eeg_buffer else None
+            'Time': time_data,
+            'HeartRate': hr,
+            'SPO2': spo2,
+            'EEG': None if np.isnan(eeg).all() else eeg
         }
 
-def detect_abnormalities_p(hr_data, spo2_data):
-    """Detect abnormal HR (<50 or >120 bpm) and SpO₂ (<90%)."""
-    abnormal_hr = np.logical_or(np.array(hr_data) < 50, np.array(hr_data) > 120)
-    abnormal_spo2 = np.array(spo2_data) < 90
-    return abnormal_hr, abnormal_spo2
-
-def detect_abnormalities_bis(eeg_data, low_threshold=20, high_threshold=80):
-    """Detect abnormal EEG (too low or too high)."""
-    eeg_array = np.array(eeg_data)
-    abnormal_eeg = np.logical_or(eeg_array < low_threshold, eeg_array > high_threshold)
-    return abnormal_eeg
-
-def draw_alert_boxes(ax, time_series, abnormal_series, color='red', alpha=0.2):
-    """Highlight time segments with abnormal values."""
-    if len(time_series) == 0 or not any(abnormal_series):
-        return
-        
-    time_array = np.array(time_series)
-    abnormal_indices = np.where(abnormal_series)[0]
-    if len(abnormal_indices) == 0:
-        return
-        
-    start_idx = abnormal_indices[0]
-    prev_idx = start_idx
-    
-    for idx in abnormal_indices[1:]:
-        if idx != prev_idx + 1:
-            ax.add_patch(patches.Rectangle(
-                (time_array[start_idx], ax.get_ylim()[0]),
-                time_array[prev_idx] - time_array[start_idx],
-                ax.get_ylim()[1] - ax.get_ylim()[0],
-                linewidth=0, facecolor=color, alpha=alpha))
-            start_idx = idx
-        prev_idx = idx
-        
-    ax.add_patch(patches.Rectangle(
-        (time_array[start_idx], ax.get_ylim()[0]),
-        time_array[prev_idx] - time_array[start_idx],
-        ax.get_ylim()[1] - ax.get_ylim()[0],
-        linewidth=0, facecolor=color, alpha=alpha))
+@njit(cache=True)
+def _abnormal_masks(hr, spo2, eeg, low_eeg, high_eeg):
+    out = np.empty((3, hr.size), dtype=np.bool_)
+    for i in range(hr.size):
+        out[0, i] = hr[i] < 50 or hr[i] > 120
+        out[1, i] = spo2[i] < 90
+        out[2, i] = eeg[i] < low_eeg or eeg[i] > high_eeg
+    return out
 
-def update_plot(fig, axes, data_buffer, low_eeg=20, high_eeg=80):
-    """Update the plot with new data."""
-    data = data_buffer.get_data()
-    if not data['Time']:  # No data yet
+def detect_abnormalities(hr_data, spo2_data, eeg_data, low_threshold=20, high_threshold=80):
+    """Detect abnormal HR (<50 or >120 bpm), SpO₂ (<90%) and EEG (too low or
+    too high) in a single pass. Missing (NaN) samples are never abnormal."""
+    abnormal_hr, abnormal_spo2, abnormal_eeg = _abnormal_masks(
+        np.asarray(hr_data, dtype=np.float64), np.asarray(spo2_data, dtype=np.float64),
+        np.asarray(eeg_data, dtype=np.float64), float(low_threshold), float(high_threshold))
+    return abnormal_hr, abnormal_spo2, abnormal_eeg
+
+def draw_alert_boxes(alerts, time_series, abnormal_series):
+    """Highlight time segments with abnormal values by refreshing the
+    polygons of the axes' alert collection (emptied when all is normal)."""
+    abnormal = np.asarray(abnormal_series, dtype=bool)
+    if len(time_series) == 0 or not abnormal.any():
+        alerts.set_verts([])
         return
 
-    # Clear all axes
-    for ax in axes:
-        ax.clear()
+    # Edges of the padded mask give one (start, stop) index pair per run
+    edges = np.flatnonzero(np.diff(np.r_[0, abnormal.view(np.int8), 0])).reshape(-1, 2)
+    starts, ends = edges[:, 0], edges[:, 1] - 1
 
-    current_time = data['Time'][-1]
-    window_start = max(0, current_time - 180)  # Show last 180 seconds
-    
-    # Update title
-    fig.suptitle(f"Real-time Signals Monitoring (Window: {window_start}s - {current_time}s)", fontsize=14)
+    ax = alerts.axes
+    time_array = np.asarray(ax.convert_xunits(time_series), dtype=float)
+    x0, x1 = time_array[starts], time_array[ends]
+    ymin, ymax = ax.get_ylim()
+
+    # One polygon per run, all in the single collection artist
+    verts = np.empty((len(starts), 4, 2))
+    verts[:, :, 0] = np.column_stack((x0, x0, x1, x1))
+    verts[:, :, 1] = (ymin, ymax, ymax, ymin)
+    alerts.set_verts(verts)
+
+def setup_plot(fig, axes):
+    """Create the artists that update_plot refreshes in place.
+
+    The x axis shows time relative to the latest sample, so the axes never
+    change between updates. Everything that does change is marked animated
+    and blitted over a cached background of the figure.
+    """
+    fig.suptitle("Real-time Signals Monitoring", fontsize=14)
 
     # HR panel
     ax = axes[0]
-    ax.plot(data['Time'], data['HeartRate'], color='blue', label='Heart Rate (bpm)')
-    abnormal_hr, abnormal_spo2 = detect_abnormalities_p(data['HeartRate'], data['SPO2'])
-    draw_alert_boxes(ax, data['Time'], abnormal_hr)
+    hr_line, = ax.plot([], [], color='blue', label='Heart Rate (bpm)', animated=True)
+    window_text = ax.text(0.01, 0.95, "", va='top', transform=ax.transAxes, animated=True)
     ax.set_ylabel("Heart Rate (bpm)")
     ax.set_ylim(40, 130)
     ax.legend(loc="upper right")
@@ -99,8 +95,7 @@ def update_plot(fig, axes, data_buffer, low_eeg=20, high_eeg=80):
 
     # SpO2 panel
     ax = axes[1]
-    ax.plot(data['Time'], data['SPO2'], color='green', label='SpO₂ (%)')
-    draw_alert_boxes(ax, data['Time'], abnormal_spo2)
+    spo2_line, = ax.plot([], [], color='green', label='SpO₂ (%)', animated=True)
     ax.set_ylabel("SpO₂ (%)")
     ax.set_ylim(85, 100)
     ax.legend(loc="upper right")
@@ -108,33 +103,88 @@ def update_plot(fig, axes, data_buffer, low_eeg=20, high_eeg=80):
 
     # EEG panel
     ax = axes[2]
-    if data['EEG'] and len(data['EEG']) > 0:
-        ax.plot(data['Time'], data['EEG'], color='purple', label='EEG (BIS)')
-        abnormal_eeg = detect_abnormalities_bis(data['EEG'], low_eeg, high_eeg)
-        draw_alert_boxes(ax, data['Time'], abnormal_eeg)
-        ax.legend(loc="upper right")
-    else:
-        ax.text(0.5, 0.5, "No BIS EEG data available", ha='center', va='center', 
-                transform=ax.transAxes, fontsize=12, color='gray')
-    ax.set_xlabel("Time (seconds)")
+    eeg_line, = ax.plot([], [], color='purple', label='EEG (BIS)', animated=True)
+    no_eeg_text = ax.text(0.5, 0.5, "No BIS EEG data available", ha='center', va='center',
+                          transform=ax.transAxes, fontsize=12, color='gray', animated=True)
+    ax.set_xlabel("Time relative to latest sample (seconds)")
     ax.set_ylabel("EEG Level")
     ax.set_ylim(0, 100)
+    ax.legend(loc="upper right")
     ax.grid(True)
 
-    # Set x-axis limits for all plots
-    for ax in axes:
-        ax.set_xlim(window_start, current_time)
+    # Show last 180 seconds (shared x axis)
+    axes[0].set_xlim(-180, 0)
+
+    # One alert box collection per panel, refreshed in place by update_plot
+    alerts = [ax.add_collection(PolyCollection([], linewidth=0, facecolor='red',
+                                               alpha=0.2, animated=True))
+              for ax in axes]
 
+    # Layout once, not on every update
     plt.tight_layout()
     plt.subplots_adjust(top=0.90)
-    fig.canvas.draw()
-    plt.pause(0.01)
+
+    artists = {'hr': hr_line, 'spo2': spo2_line, 'eeg': eeg_line,
+               'window': window_text, 'no_eeg': no_eeg_text, 'alerts': alerts,
+               'background': None}
+
+    def on_draw(event):
+        # A full redraw (first show, resize) leaves out animated artists:
+        # grab the fresh background and paint the artists back on top
+        artists['background'] = fig.canvas.copy_from_bbox(fig.bbox)
+        draw_animated(artists)
+
+    fig.canvas.mpl_connect('draw_event', on_draw)
+    return artists
+
+def draw_animated(artists):
+    """Draw the animated artists: alert boxes first, then lines and text."""
+    for artist in artists['alerts'] + [artists['hr'], artists['spo2'], artists['eeg'],
+                                       artists['window'], artists['no_eeg']]:
+        artist.axes.draw_artist(artist)
+
+def update_plot(fig, axes, artists, data_buffer, low_eeg=20, high_eeg=80):
+    """Update the plot with new data."""
+    data = data_buffer.get_data()
+    if len(data['Time']) == 0 or artists['background'] is None:  # No data or not drawn yet
+        return
+
+    current_time = data['Time'][-1]
+    window_start = max(0, current_time - 180)  # Show last 180 seconds
+    t = data['Time'] - current_time
+    artists['window'].set_text(f"Window: {window_start}s - {current_time}s")
+
+    eeg = data['EEG'] if data['EEG'] is not None else np.full(len(t), np.nan)
+    abnormal_hr, abnormal_spo2, abnormal_eeg = detect_abnormalities(
+        data['HeartRate'], data['SPO2'], eeg, low_eeg, high_eeg)
+    artists['hr'].set_data(t, data['HeartRate'])
+    artists['spo2'].set_data(t, data['SPO2'])
+    draw_alert_boxes(artists['alerts'][0], t, abnormal_hr)
+    draw_alert_boxes(artists['alerts'][1], t, abnormal_spo2)
+
+    if data['EEG'] is not None:
+        artists['eeg'].set_data(t, data['EEG'])
+        draw_alert_boxes(artists['alerts'][2], t, abnormal_eeg)
+        artists['no_eeg'].set_visible(False)
+    else:
+        artists['eeg'].set_data([], [])
+        artists['alerts'][2].set_verts([])
+        artists['no_eeg'].set_visible(True)
+
+    # Restore the cached background and redraw only what changed
+    fig.canvas.restore_region(artists['background'])
+    draw_animated(artists)
+    fig.canvas.blit(fig.bbox)
+    fig.canvas.flush_events()
 
 def simulate_realtime_monitoring(data_folder, update_interval=1.0, low_eeg=20, high_eeg=80):
     """Simulate real-time monitoring of vital signs."""
     # Set up the plot
     plt.ion()  # Turn on interactive mode
     fig, axes = plt.subplots(3, 1, figsize=(14, 8), sharex=True)
+    artists = setup_plot(fig, axes)
+    plt.show(block=False)
+    plt.pause(0.1)  # first full draw caches the background
     
     # Initialize data buffer
     data_buffer = RealTimeDataBuffer(window_size=180)  # Store 180 seconds of data
@@ -148,39 +198,32 @@ def simulate_realtime_monitoring(data_folder, update_interval=1.0, low_eeg=20, h
     # Load first P file
     filename = p_files[0]
     num = filename.split('_')[1].split('.')[0]
-    p_data = pd.read_csv(os.path.join(data_folder, filename))
-    p_data.columns = ['Time', 'HeartRate', 'SPO2']
+    p_data = pd.read_csv(os.path.join(data_folder, filename), header=0,
+                         names=['Time', 'HeartRate', 'SPO2'],
+                         dtype={'HeartRate': 'float32', 'SPO2': 'float32'})
     
-    # Try to load corresponding BIS file
-    bis_data = None
+    # Try to load corresponding BIS file and line it up with the P samples
+    # once, so the loop below does no DataFrame lookups (exact time matches
+    # only, first BIS row wins for repeated times; EEG is NaN otherwise)
     bis_filename = f"BIS_{num}.csv"
     if os.path.exists(os.path.join(data_folder, bis_filename)):
-        bis_data = pd.read_csv(os.path.join(data_folder, bis_filename))
-        bis_data.columns = ['Time', 'EEG']
+        bis_data = pd.read_csv(os.path.join(data_folder, bis_filename), header=0,
+                               names=['Time', 'EEG'], dtype={'EEG': 'float32'})
+        merged = p_data.merge(bis_data.drop_duplicates('Time'), on='Time', how='left')
+    else:
+        merged = p_data.assign(EEG=np.nan)
     
     print(f"Starting real-time monitoring simulation...")
     print("Press Ctrl+C to stop the monitoring")
     
     try:
         # Simulate real-time data stream at 5-second intervals
-        for i in range(0, len(p_data), 5):  # Step by 5 to simulate 5-second intervals
-            # Get current data point
-            time_val = p_data.iloc[i]['Time']
-            hr_val = p_data.iloc[i]['HeartRate']
-            spo2_val = p_data.iloc[i]['SPO2']
-            
-            # Get corresponding BIS data if available
-            eeg_val = None
-            if bis_data is not None:
-                matching_bis = bis_data[bis_data['Time'] == time_val]
-                if not matching_bis.empty:
-                    eeg_val = matching_bis.iloc[0]['EEG']
-            
+        for row in merged.iloc[::5].itertuples(index=False):  # Step by 5 to simulate 5-second intervals
             # Update data buffer
-            data_buffer.update(time_val, hr_val, spo2_val, eeg_val)
+            data_buffer.update(row.Time, row.HeartRate, row.SPO2, row.EEG)
             
             # Update plot
-            update_plot(fig, axes, data_buffer, low_eeg, high_eeg)
+            update_plot(fig, axes, artists, data_buffer, low_eeg, high_eeg)
             
             # Wait for next update
             time.sleep(update_interval)